@@ -4,12 +4,15 @@
 Duck Decode Android - Steganography Decoder Tool
 Simplified stable version
 """
+from __future__ import annotations
+
+import io
 import os
 import sys
 import struct
+import threading
 import traceback
-import numpy as np
-from PIL import Image
+from collections import deque
 from datetime import datetime
 
 from kivy.app import App
@@ -22,13 +25,25 @@ from kivy.uix.popup import Popup
 from kivy.clock import Clock
 from kivy.utils import platform
 from kivy.core.window import Window
+from kivy.core.text import LabelBase
 from kivy.graphics import Color, Rectangle, RoundedRectangle
 from kivy.metrics import dp, sp
 
+# numpy / PIL / numba 较重，由 load_decode_modules() 在首次解码时导入
+np = None
+Image = None
+HAS_NUMBA = False
+_extract_bits_kernel = None
+
 # Android Chinese font path
 ANDROID_CHINESE_FONT = '/system/fonts/NotoSansCJK-Regular.ttc'
 ANDROID_FALLBACK_FONT = '/system/fonts/DroidSansFallback.ttf'
 
+# 调试日志开关：发布版默认关闭，设置 DUCKDECODE_DEBUG 环境变量可重新打开
+_DEBUG = bool(os.environ.get('DUCKDECODE_DEBUG'))
+# 最近的日志只留在内存里，崩溃时随错误日志一起写出
+_LOG_BUFFER = deque(maxlen=500)
+
 # Simple Colors
 PRIMARY = (0.26, 0.35, 0.76, 1)
 SUCCESS = (0.20, 0.73, 0.33, 1)
@@ -46,12 +61,21 @@ def get_chinese_font():
                 return ANDROID_CHINESE_FONT
             elif os.path.exists(ANDROID_FALLBACK_FONT):
                 return ANDROID_FALLBACK_FONT
-    except:
+    except Exception:
         pass
     return 'Roboto'
 
 
-CHINESE_FONT = get_chinese_font()
+def register_chinese_font():
+    """字体文件只探测一次，注册成命名字体供所有中文控件共用"""
+    font = get_chinese_font()
+    if font == 'Roboto':
+        return font
+    LabelBase.register(name='ChineseFont', fn_regular=font)
+    return 'ChineseFont'
+
+
+CHINESE_FONT = register_chinese_font()
 
 
 # 全局错误捕获
@@ -64,15 +88,75 @@ def global_exception_handler(exc_type, exc_value, exc_traceback):
             log_path = os.path.join(app.user_data_dir, "error_log.txt")
             with open(log_path, "w", encoding="utf-8") as f:
                 f.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n{error_msg}")
-    except:
+                if _LOG_BUFFER:
+                    f.write("\n最近日志:\n" + "\n".join(_LOG_BUFFER) + "\n")
+    except Exception:
         pass
 
 
 sys.excepthook = global_exception_handler
 
+
+# Java 类反射代价高，每个类只 autoclass 一次
+_JAVA_CLASSES = {}
+
+
+def java_class(name):
+    cls = _JAVA_CLASSES.get(name)
+    if cls is None:
+        from jnius import autoclass
+        cls = _JAVA_CLASSES[name] = autoclass(name)
+    return cls
+
 CATEGORY = "SSTool"
 WATERMARK_SKIP_W_RATIO = 0.40
 WATERMARK_SKIP_H_RATIO = 0.08
+_U32 = struct.Struct(">I")
+
+
+def _extract_bits(arr, skip_h, skip_w, k, n_vals, out):
+    """单次遍历像素：跳过水印区域、取低k位并直接拼接写入out（装了 numba 时编译后使用）"""
+    h, w, c = arr.shape
+    mask = (1 << k) - 1
+    acc = 0
+    nacc = 0
+    o = 0
+    i = 0
+    for y in range(h):
+        x0 = skip_w if y < skip_h else 0
+        for x in range(x0, w):
+            for ch in range(c):
+                if i >= n_vals:
+                    if nacc > 0:
+                        out[o] = (acc << (8 - nacc)) & 0xFF
+                    return
+                acc = (acc << k) | (arr[y, x, ch] & mask)
+                nacc += k
+                i += 1
+                while nacc >= 8:
+                    nacc -= 8
+                    out[o] = (acc >> nacc) & 0xFF
+                    o += 1
+                acc &= (1 << nacc) - 1
+    if nacc > 0:
+        out[o] = (acc << (8 - nacc)) & 0xFF
+
+
+def load_decode_modules():
+    """首次解码时才导入 numpy、PIL 和可选的 numba，缩短应用启动时间"""
+    global np, Image, HAS_NUMBA, _extract_bits_kernel
+    if np is not None:
+        return
+    import numpy
+    from PIL import Image as PILImage
+    try:
+        from numba import njit
+        _extract_bits_kernel = njit(cache=True, boundscheck=False, nogil=True)(_extract_bits)
+        HAS_NUMBA = True
+    except ImportError:
+        HAS_NUMBA = False
+    Image = PILImage
+    np = numpy
 
 
 # ==================== 中文支持组件 ====================
@@ -98,45 +182,106 @@ class ChineseTextInput(TextInput):
 # ==================== 解码逻辑 ====================
 
 class SafeDecodeLogic:
+    # 最近一张图片各 k 的提取结果（header 或异常），换密码重试时免去重复加载和提取
+    _cached_image = None
+    _cached_headers = {}
+
+    @staticmethod
+    def watermark_skip(h: int, w: int):
+        """左上角水印区域的高和宽"""
+        return int(h * WATERMARK_SKIP_H_RATIO), int(w * WATERMARK_SKIP_W_RATIO)
+
     @staticmethod
-    def extract_payload_with_k(arr: np.ndarray, k: int) -> bytes:
+    def peek_header_len(arr: np.ndarray, k: int):
+        """只读前32位得到载荷长度；容量不足或长度不合理时返回 None，不抛异常"""
+        h, w, c = arr.shape
+        skip_h, skip_w = SafeDecodeLogic.watermark_skip(h, w)
+        nbits = (h * w - skip_h * skip_w) * c * k
+        if nbits < 32:
+            return None
+        head = SafeDecodeLogic.extract_low_bits(arr, skip_h, skip_w, (32 + k - 1) // k, k)
+        header_len = _U32.unpack_from(head)[0]
+        if header_len <= 0 or 32 + header_len * 8 > nbits:
+            return None
+        return header_len
+
+    @staticmethod
+    def extract_payload_with_k(arr: np.ndarray, k: int, header_len: int = None) -> bytes:
         try:
+            if header_len is None:
+                header_len = SafeDecodeLogic.peek_header_len(arr, k)
+                if header_len is None:
+                    raise ValueError("文件数据长度异常")
             h, w, c = arr.shape
-            skip_w = int(w * WATERMARK_SKIP_W_RATIO)
-            skip_h = int(h * WATERMARK_SKIP_H_RATIO)
-            mask2d = np.ones((h, w), dtype=bool)
-            if skip_w > 0 and skip_h > 0:
-                mask2d[:skip_h, :skip_w] = False
-            mask3d = np.repeat(mask2d[:, :, None], c, axis=2)
-            flat = arr.reshape(-1)
-            idxs = np.flatnonzero(mask3d.reshape(-1))
-            vals = (flat[idxs] & ((1 << k) - 1)).astype(np.uint8)
-            ub = np.unpackbits(vals, bitorder="big").reshape(-1, 8)[:, -k:]
-            bits = ub.reshape(-1)
-            if len(bits) < 32:
-                raise ValueError("图片数据太少，无法解码")
-            len_bits = bits[:32]
-            length_bytes = np.packbits(len_bits, bitorder="big").tobytes()
-            header_len = struct.unpack(">I", length_bytes)[0]
-            total_bits = 32 + header_len * 8
-            if header_len <= 0 or total_bits > len(bits):
-                raise ValueError("文件数据长度异常")
-            payload_bits = bits[32:32 + header_len * 8]
-            return np.packbits(payload_bits, bitorder="big").tobytes()
+            skip_h, skip_w = SafeDecodeLogic.watermark_skip(h, w)
+            # 只取长度前缀和载荷所需的像素，不展开整张图
+            n_need = (32 + header_len * 8 + k - 1) // k
+            packed = SafeDecodeLogic.extract_low_bits(arr, skip_h, skip_w, n_need, k)
+            return packed[4:4 + header_len].tobytes()
         except Exception as e:
             raise Exception(f"提取数据失败: {str(e)}")
 
     @staticmethod
-    def generate_key_stream(password: str, salt: bytes, length: int) -> bytes:
+    def extract_low_bits(arr: np.ndarray, skip_h: int, skip_w: int, n: int, k: int) -> np.ndarray:
+        """按行优先顺序取水印区域外的前n个字节，拼接它们的低k位"""
+        if HAS_NUMBA:
+            packed = np.empty((n * k + 7) // 8, dtype=np.uint8)
+            _extract_bits_kernel(arr, skip_h, skip_w, k, n, packed)
+            return packed
+        # 保留区域 = 水印右侧的顶部条带 + 其下方的整行，直接切片，不建掩码和下标；
+        # 取低k位时直接写进预分配的 vals，不产生拼接和掩码的中间数组
+        mask_k = np.uint8((1 << k) - 1)
+        vals = np.empty(n, dtype=np.uint8)
+        top = arr[:skip_h, skip_w:]
+        n_top = min(n, top.size)
+        if n_top:
+            row = top.shape[1] * top.shape[2]
+            full, part = divmod(n_top, row)
+            if full:
+                np.bitwise_and(top[:full], mask_k, out=vals[:full * row].reshape(full, top.shape[1], top.shape[2]))
+            if part:
+                np.bitwise_and(top[full].reshape(-1)[:part], mask_k, out=vals[full * row:n_top])
+        if n > n_top:
+            np.bitwise_and(arr[skip_h:].reshape(-1)[:n - n_top], mask_k, out=vals[n_top:])
+        return SafeDecodeLogic.pack_low_bits(vals, k)
+
+    @staticmethod
+    def pack_low_bits(vals: np.ndarray, k: int) -> np.ndarray:
+        """把每个值的低k位按大端顺序直接拼接成字节流（vals须已按k位掩码）"""
+        n = len(vals)
+        if k == 8:
+            return vals
+        if k in (2, 6):
+            # 常用的 k 直接在 uint8 上移位拼接，不经过 uint64 中间数组
+            if n % 4:
+                vals = np.concatenate([vals, np.zeros(4 - n % 4, dtype=np.uint8)])
+            q = vals.reshape(-1, 4)
+            if k == 2:
+                out = (q[:, 0] << 6) | (q[:, 1] << 4) | (q[:, 2] << 2) | q[:, 3]
+            else:
+                # 4个6位值 -> 3个字节
+                out = np.empty((len(q), 3), dtype=np.uint8)
+                out[:, 0] = (q[:, 0] << 2) | (q[:, 1] >> 4)
+                out[:, 1] = (q[:, 1] << 4) | (q[:, 2] >> 2)
+                out[:, 2] = (q[:, 2] << 6) | q[:, 3]
+                out = out.reshape(-1)
+            return out[:(n * k + 7) // 8]
+        bits = np.unpackbits(vals, bitorder="big").reshape(-1, 8)[:, -k:].reshape(-1)
+        return np.packbits(bits, bitorder="big")
+
+    @staticmethod
+    def generate_key_stream(base, length: int) -> bytearray:
         try:
-            import hashlib
-            key_material = (password + salt.hex()).encode("utf-8")
-            out = bytearray()
-            counter = 0
-            while len(out) < length:
-                out.extend(hashlib.sha256(key_material + str(counter).encode("utf-8")).digest())
-                counter += 1
-            return bytes(out[:length])
+            # 必须与编码端一致：第 n 块为 sha256(key_material + 十进制 n)；
+            # base 是已吸收 key_material 的哈希状态，每块复制后只补上计数器
+            # 一次分配好整段密钥流，逐块写入，最后一块按剩余长度截断
+            out = bytearray(length)
+            mv = memoryview(out)
+            for counter, off in enumerate(range(0, length, 32)):
+                h = base.copy()
+                h.update(b"%d" % counter)
+                mv[off:off + 32] = h.digest()[:length - off]
+            return out
         except Exception as e:
             raise Exception(f"密码处理失败: {str(e)}")
 
@@ -146,6 +291,8 @@ class SafeDecodeLogic:
             idx = 0
             if len(header) < 1:
                 raise ValueError("文件头损坏")
+            # 只对小字段复制成 bytes，数据区保持为 header 的视图
+            mv = memoryview(header)
             has_pwd = header[0] == 1
             idx += 1
             pwd_hash = b""
@@ -153,9 +300,9 @@ class SafeDecodeLogic:
             if has_pwd:
                 if len(header) < idx + 32 + 16:
                     raise ValueError("文件头损坏")
-                pwd_hash = header[idx:idx + 32]
+                pwd_hash = bytes(mv[idx:idx + 32])
                 idx += 32
-                salt = header[idx:idx + 16]
+                salt = bytes(mv[idx:idx + 16])
                 idx += 16
             if len(header) < idx + 1:
                 raise ValueError("文件头损坏")
@@ -163,11 +310,11 @@ class SafeDecodeLogic:
             idx += 1
             if len(header) < idx + ext_len + 4:
                 raise ValueError("文件头损坏")
-            ext = header[idx:idx + ext_len].decode("utf-8", errors="ignore")
+            ext = bytes(mv[idx:idx + ext_len]).decode("utf-8", errors="ignore")
             idx += ext_len
-            data_len = struct.unpack(">I", header[idx:idx + 4])[0]
+            data_len = _U32.unpack_from(mv, idx)[0]
             idx += 4
-            data = header[idx:]
+            data = mv[idx:]
             if len(data) != data_len:
                 raise ValueError("数据长度不匹配")
             if not has_pwd:
@@ -175,48 +322,118 @@ class SafeDecodeLogic:
             if not password:
                 raise ValueError("此图片需要密码才能解码")
             import hashlib
-            check_hash = hashlib.sha256((password + salt.hex()).encode("utf-8")).digest()
-            if check_hash != pwd_hash:
+            # 密码校验与密钥流共用同一个已吸收 password + salt.hex() 的哈希状态
+            base = hashlib.sha256((password + salt.hex()).encode("utf-8"))
+            if base.digest() != pwd_hash:
                 raise ValueError("密码错误，请重新输入")
-            ks = SafeDecodeLogic.generate_key_stream(password, salt, len(data))
-            plain = bytes(a ^ b for a, b in zip(data, ks))
-            return plain, ext
+            ks = SafeDecodeLogic.generate_key_stream(base, len(data))
+            return SafeDecodeLogic.xor_bytes(data, ks), ext
         except Exception as e:
             raise Exception(f"解析文件头失败: {str(e)}")
 
     @staticmethod
-    def binpng_bytes_to_mp4_bytes(p: str) -> bytes:
+    def xor_bytes(data: bytes, ks: bytes) -> bytearray:
+        # 在 data 的唯一一份拷贝上原地异或，直接返回 bytearray，不再复制成 bytes
+        buf = bytearray(data)
+        out = np.frombuffer(buf, dtype=np.uint8)
+        np.bitwise_xor(out, np.frombuffer(ks, dtype=np.uint8, count=len(buf)), out=out)
+        return buf
+
+    @staticmethod
+    def binpng_bytes_to_mp4_bytes(raw: bytes) -> bytes:
         try:
-            img = Image.open(p).convert("RGB")
-            arr = np.array(img).astype(np.uint8)
-            flat = arr.reshape(-1, 3).reshape(-1)
-            return flat.tobytes().rstrip(b"\x00")
+            img = Image.open(io.BytesIO(raw))
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            arr = np.asarray(img)
+            return SafeDecodeLogic.strip_trailing_zeros(arr.reshape(-1))
         except Exception as e:
             raise Exception(f"转换视频格式失败: {str(e)}")
 
+    @staticmethod
+    def strip_trailing_zeros(flat: np.ndarray) -> bytes:
+        """从尾部按块向前找最后一个非零字节，只复制它之前的数据"""
+        end = flat.size
+        step = 1 << 16
+        while end > 0:
+            start = max(0, end - step)
+            nz = np.flatnonzero(flat[start:end])
+            if nz.size:
+                end = start + int(nz[-1]) + 1
+                break
+            end = start
+        return flat[:end].tobytes()
+
+    @staticmethod
+    def write_file(path: str, data: bytes):
+        """用 os.write 直接写出，不经过 Python 的缓冲层"""
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o666)
+        try:
+            mv = memoryview(data)
+            while mv:
+                mv = mv[os.write(fd, mv):]
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def load_image_array(image_path: str) -> np.ndarray:
+        img = Image.open(image_path)
+        # 先按文件头里的尺寸估算容量（k=8 时最大），连长度前缀和一个字节都放不下就不必解码像素
+        w, h = img.size
+        skip_h, skip_w = SafeDecodeLogic.watermark_skip(h, w)
+        if (h * w - skip_h * skip_w) * 3 * 8 < 32 + 8:
+            raise ValueError("图片尺寸太小，不包含隐藏数据")
+        # RGB 图片无需 convert，asarray 只做 Pillow 导出的那一次复制
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        return np.asarray(img)
+
     @staticmethod
     def decode(image_path: str, password: str, output_dir: str, callback=None):
         try:
-            if callback:
-                callback("正在加载图片...")
+            load_decode_modules()
 
             if not os.path.exists(image_path):
                 raise FileNotFoundError(f"图片文件不存在: {image_path}")
 
-            img = Image.open(image_path)
-            arr = np.array(img.convert("RGB")).astype(np.uint8)
-
-            if callback:
-                callback("正在从图片中提取隐藏数据...")
+            # 同一张图片换密码重试时，直接复用上次各 k 的提取结果
+            st = os.stat(image_path)
+            image_key = (os.path.abspath(image_path), st.st_mtime_ns, st.st_size)
+            if SafeDecodeLogic._cached_image != image_key:
+                SafeDecodeLogic._cached_image = image_key
+                SafeDecodeLogic._cached_headers = {}
+            headers = SafeDecodeLogic._cached_headers
 
-            header = None
+            arr = None
             raw = None
             ext = None
             last_err = None
 
             for k in (2, 6, 8):
+                if k not in headers:
+                    if arr is None:
+                        if callback:
+                            callback("正在加载图片...")
+                        arr = SafeDecodeLogic.load_image_array(image_path)
+                        if callback:
+                            callback("正在从图片中提取隐藏数据...")
+                    # 先读长度前缀，长度不合理的 k 直接跳过，不经过异常流程
+                    header_len = SafeDecodeLogic.peek_header_len(arr, k)
+                    if header_len is None:
+                        headers[k] = (ValueError, ("提取数据失败: 文件数据长度异常",))
+                    else:
+                        try:
+                            headers[k] = SafeDecodeLogic.extract_payload_with_k(arr, k, header_len)
+                        except Exception as e:
+                            # 只缓存异常类型和参数：异常对象的 traceback/__context__
+                            # 会引用栈帧，让像素数组一直留在类级缓存里
+                            headers[k] = (type(e), e.args)
+                header = headers[k]
+                if isinstance(header, tuple):
+                    err_type, err_args = header
+                    last_err = err_type(*err_args)
+                    continue
                 try:
-                    header = SafeDecodeLogic.extract_payload_with_k(arr, k)
                     raw, ext = SafeDecodeLogic.parse_header(header, password)
                     break
                 except Exception as e:
@@ -238,19 +455,14 @@ class SafeDecodeLogic:
 
             try:
                 if ext.endswith(".binpng"):
-                    tmp_png = out_path + ".binpng"
-                    with open(tmp_png, "wb") as f:
-                        f.write(raw)
-                    mp4_bytes = SafeDecodeLogic.binpng_bytes_to_mp4_bytes(tmp_png)
-                    os.unlink(tmp_png)
+                    # 直接从内存解出 PNG，不再落地临时文件
+                    mp4_bytes = SafeDecodeLogic.binpng_bytes_to_mp4_bytes(raw)
                     final_path = out_path + ".mp4"
-                    with open(final_path, "wb") as f:
-                        f.write(mp4_bytes)
+                    SafeDecodeLogic.write_file(final_path, mp4_bytes)
                     final_ext = "mp4"
                 else:
                     final_path = out_path + ("." + ext if not ext.startswith(".") else ext)
-                    with open(final_path, "wb") as f:
-                        f.write(raw)
+                    SafeDecodeLogic.write_file(final_path, raw)
                     final_ext = ext.lstrip(".")
             except Exception as e:
                 raise Exception(f"保存文件失败: {str(e)}")
@@ -273,7 +485,7 @@ class SafeDecodeLogic:
 
 class DuckDecodeApp(App):
     def build(self):
-        print("DuckDecode: build() started", file=sys.stderr)
+        self.log("DuckDecode: build() started")
 
         self.title = "Duck Decode"
         Window.softinput_mode = "below_target"
@@ -287,10 +499,12 @@ class DuckDecodeApp(App):
             Color(*PRIMARY)
             header.rect = Rectangle(pos=header.pos, size=header.size)
 
-        def update_header(instance, value):
-            instance.rect.pos = instance.pos
-            instance.rect.size = instance.size
-        header.bind(pos=update_header, size=update_header)
+        # pos 和 size 在一次布局中往往先后变化，合并到下一帧只更新一次
+        def update_header(dt):
+            header.rect.pos = header.pos
+            header.rect.size = header.size
+        update_header_trigger = Clock.create_trigger(update_header, 0)
+        header.bind(pos=update_header_trigger, size=update_header_trigger)
 
         title = ChineseLabel(
             text="🦆 鸭鸭解码器\n图片隐写解码工具",
@@ -445,8 +659,17 @@ class DuckDecodeApp(App):
 
         self.selected_file = None
         self.output_dir = self.get_default_output_dir()
-
-        print("DuckDecode: build() complete", file=sys.stderr)
+        self._error_popup = None
+        self._success_popup = None
+        # 进度消息先记下，每 50ms 最多刷新一次状态标签
+        self._pending_progress = None
+        self._progress_trigger = Clock.create_trigger(self.flush_progress, 0.05)
+        # 解码成功 3 秒后恢复按钮，每次成功复用同一个触发器
+        self._reset_trigger = Clock.create_trigger(self.reset_decode_btn, 3)
+        self._decode_outcome = None
+        self._finish_trigger = Clock.create_trigger(self.finish_decode)
+
+        self.log("DuckDecode: build() complete")
         return root
 
     def get_default_output_dir(self):
@@ -458,12 +681,12 @@ class DuckDecodeApp(App):
                 os.makedirs(pictures_dir, exist_ok=True)
                 return pictures_dir
             return os.getcwd()
-        except:
+        except Exception:
             return "."
 
     def safe_select_file(self, instance):
         try:
-            print("DuckDecode: Select file", file=sys.stderr)
+            self.log("DuckDecode: Select file")
             if platform == 'android':
                 self.select_file_android()
             else:
@@ -478,30 +701,31 @@ class DuckDecodeApp(App):
 
     def select_file_android(self):
         try:
-            from jnius import autoclass
             from android import activity
 
-            Intent = autoclass('android.content.Intent')
+            Intent = java_class('android.content.Intent')
 
             def on_activity_result(request_code, result_code, intent):
                 if request_code == 1001 and result_code == -1:
                     try:
                         uri = intent.getData()
-                        cr = autoclass('org.kivy.android.PythonActivity').mActivity.getContentResolver()
+                        cr = java_class('org.kivy.android.PythonActivity').mActivity.getContentResolver()
                         inp = cr.openInputStream(uri)
-                        data = bytearray()
-                        buf = bytearray(8192)
-                        while True:
-                            r = inp.read(buf, 0, 8192)
-                            if r == -1:
-                                break
-                            data.extend(buf[:r])
-                        inp.close()
 
+                        # 大块读取减少 JNI 往返，边读边写入临时文件，不在内存里攒整张图
                         import tempfile
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as f:
-                            f.write(data)
-                            self.selected_file = f.name
+                        buf = bytearray(262144)
+                        mv = memoryview(buf)
+                        try:
+                            with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as f:
+                                while True:
+                                    r = inp.read(buf, 0, len(buf))
+                                    if r == -1:
+                                        break
+                                    f.write(mv[:r])
+                                self.selected_file = f.name
+                        finally:
+                            inp.close()
 
                         self.file_btn.text = "✓ 已选择图片"
                         self.file_btn.background_color = SUCCESS
@@ -514,13 +738,13 @@ class DuckDecodeApp(App):
             intent = Intent()
             intent.setAction(Intent.ACTION_GET_CONTENT)
             intent.setType("image/*")
-            autoclass('org.kivy.android.PythonActivity').mActivity.startActivityForResult(intent, 1001)
+            java_class('org.kivy.android.PythonActivity').mActivity.startActivityForResult(intent, 1001)
         except Exception as e:
             print(f"Chooser error: {e}", file=sys.stderr)
 
     def safe_start_decode(self, instance):
         try:
-            print("DuckDecode: Start decode", file=sys.stderr)
+            self.log("DuckDecode: Start decode")
 
             if not self.selected_file:
                 self.show_error_dialog("请先选择图片", "请点击上方按钮选择含有隐藏信息的图片")
@@ -528,32 +752,63 @@ class DuckDecodeApp(App):
 
             password = self.password_input.text
 
+            self._reset_trigger.cancel()
             self.status_label.text = "正在解码..."
             self.decode_btn.disabled = True
             self.decode_btn.text = "解码中..."
             self.result_label.text = ""
             self.open_btn.disabled = True
 
-            Clock.schedule_once(lambda dt: self.safe_do_decode(password), 0.1)
+            # 解码在后台线程执行，界面保持响应
+            threading.Thread(
+                target=self.safe_do_decode,
+                args=(self.selected_file, password, self.output_dir),
+                daemon=True
+            ).start()
         except Exception as e:
             print(f"Start error: {e}", file=sys.stderr)
             self.decode_btn.disabled = False
             self.decode_btn.text = "开始解码"
 
-    def safe_do_decode(self, password):
+    def safe_do_decode(self, image_path, password, output_dir):
+        """后台线程：执行解码，结果记在 _decode_outcome 上，由主线程的触发器取走"""
+        try:
+            self.log("DuckDecode: Decoding...")
+            result = SafeDecodeLogic.decode(image_path, password, output_dir, callback=self.post_progress)
+        except Exception as e:
+            print(f"Decode error: {e}", file=sys.stderr)
+            self._decode_outcome = (False, str(e))
+        else:
+            self._decode_outcome = (True, result)
+        self._finish_trigger()
+
+    def post_progress(self, msg):
+        """后台线程调用：只记下最新消息，由触发器在主线程刷新"""
+        self._pending_progress = msg
+        self._progress_trigger()
+
+    def finish_decode(self, dt):
+        ok, value = self._decode_outcome
+        self._decode_outcome = None
+        if ok:
+            self.on_decode_success(value)
+        else:
+            self.on_decode_error(value)
+
+    def flush_progress(self, dt):
+        self.status_label.text = self._pending_progress
+
+    def on_decode_success(self, result):
+        # 取消尚未触发的刷新，直接显示最后一条进度
+        self._progress_trigger.cancel()
+        self.flush_progress(0)
         try:
-            print("DuckDecode: Decoding...", file=sys.stderr)
-
-            result = SafeDecodeLogic.decode(
-                self.selected_file, password, self.output_dir,
-                callback=lambda msg: setattr(self.status_label, 'text', msg)
-            )
-
             final_path, final_ext, size_str = result
+            filename = os.path.basename(final_path)
 
             self.result_label.text = (
                 f"🎉 解码成功！\n\n"
-                f"文件名: {os.path.basename(final_path)}\n"
+                f"文件名: {filename}\n"
                 f"文件类型: {final_ext.upper()}\n"
                 f"文件大小: {size_str}\n"
                 f"保存位置: 图库/Pictures/DuckDecode"
@@ -564,87 +819,91 @@ class DuckDecodeApp(App):
             self.decode_btn.background_color = SUCCESS
             self.open_btn.disabled = False
 
-            self.show_success_dialog("解码成功", f"文件已保存到:\n图库/Pictures/DuckDecode\n\n文件名: {os.path.basename(final_path)}")
-
-            Clock.schedule_once(lambda dt: self.reset_decode_btn(), 3)
+            self.show_success_dialog("解码成功", f"文件已保存到:\n图库/Pictures/DuckDecode\n\n文件名: {filename}")
 
+            self._reset_trigger()
         except Exception as e:
             print(f"Decode error: {e}", file=sys.stderr)
-            self.status_label.text = "解码失败"
-            self.decode_btn.disabled = False
-            self.decode_btn.text = "重新解码"
-            self.result_label.text = f"错误: {str(e)}"
-            self.show_error_dialog("解码失败", str(e))
+            self.on_decode_error(str(e))
 
-    def reset_decode_btn(self):
+    def on_decode_error(self, error_msg):
+        self._progress_trigger.cancel()
+        self.status_label.text = "解码失败"
+        self.decode_btn.disabled = False
+        self.decode_btn.text = "重新解码"
+        self.result_label.text = f"错误: {error_msg}"
+        self.show_error_dialog("解码失败", error_msg)
+
+    def reset_decode_btn(self, dt):
         self.decode_btn.text = "🚀 步骤3：开始解码"
         self.decode_btn.background_color = PRIMARY
 
     def safe_open_output_dir(self, instance):
         try:
             if platform == 'android':
-                from jnius import autoclass
-                Intent = autoclass('android.content.Intent')
+                Intent = java_class('android.content.Intent')
                 intent = Intent()
                 intent.setAction(Intent.ACTION_VIEW)
-                uri = autoclass('android.net.Uri').parse(f"file://{self.output_dir}")
+                uri = java_class('android.net.Uri').parse(f"file://{self.output_dir}")
                 intent.setDataAndType(uri, "resource/folder")
-                autoclass('org.kivy.android.PythonActivity').mActivity.startActivity(intent)
+                java_class('org.kivy.android.PythonActivity').mActivity.startActivity(intent)
+            elif platform == 'win':
+                os.startfile(self.output_dir)
             else:
                 import subprocess
-                subprocess.Popen(f'explorer "{self.output_dir}"')
+                subprocess.Popen(['open' if platform == 'macosx' else 'xdg-open', self.output_dir])
         except Exception as e:
             print(f"Open error: {e}", file=sys.stderr)
             self.show_error_dialog("打开失败", "请手动打开文件管理器查看:\n图库/Pictures/DuckDecode")
 
     def log(self, msg):
-        print(msg, file=sys.stderr)
+        _LOG_BUFFER.append(msg)
+        if _DEBUG:
+            sys.stderr.write(msg + '\n')
 
     def show_error_dialog(self, title, message):
         try:
-            content = BoxLayout(orientation='vertical', padding=dp(20), spacing=dp(15))
-
-            icon = ChineseLabel(text="❌", font_size=sp(40), size_hint_y=None, height=dp(50), halign='center')
-            msg = ChineseLabel(text=message, font_size=sp(14), size_hint_y=None, height=dp(100), halign='center')
-            btn = ChineseButton(text="我知道了", size_hint_y=None, height=dp(45), font_size=sp(16))
-
-            content.add_widget(icon)
-            content.add_widget(msg)
-            content.add_widget(btn)
-
-            popup = Popup(title=title, title_font_size=sp(18), title_color=ERROR,
-                          content=content, size_hint=(0.9, 0.45), auto_dismiss=False)
-
-            btn.bind(on_press=lambda x: popup.dismiss())
-            popup.open()
+            if self._error_popup is None:
+                self._error_popup, self._error_msg = self.build_dialog("❌", ERROR, "我知道了")
+            self._error_popup.title = title
+            self._error_msg.text = message
+            self._error_popup.open()
         except Exception as e:
             print(f"Dialog error: {e}", file=sys.stderr)
 
     def show_success_dialog(self, title, message):
         try:
-            content = BoxLayout(orientation='vertical', padding=dp(20), spacing=dp(15))
+            if self._success_popup is None:
+                self._success_popup, self._success_msg = self.build_dialog(
+                    "✅", SUCCESS, "太好了！", background_color=SUCCESS, color=(1, 1, 1, 1))
+            self._success_popup.title = title
+            self._success_msg.text = message
+            self._success_popup.open()
+        except Exception as e:
+            print(f"Dialog error: {e}", file=sys.stderr)
 
-            icon = ChineseLabel(text="✅", font_size=sp(40), size_hint_y=None, height=dp(50), halign='center')
-            msg = ChineseLabel(text=message, font_size=sp(14), size_hint_y=None, height=dp(100), halign='center')
-            btn = ChineseButton(text="太好了！", size_hint_y=None, height=dp(45), font_size=sp(16),
-                               background_color=SUCCESS, color=(1,1,1,1))
+    def build_dialog(self, icon_text, title_color, btn_text, **btn_kwargs):
+        """弹窗控件只在第一次显示时创建，之后复用，只更新标题和内容"""
+        content = BoxLayout(orientation='vertical', padding=dp(20), spacing=dp(15))
 
-            content.add_widget(icon)
-            content.add_widget(msg)
-            content.add_widget(btn)
+        icon = ChineseLabel(text=icon_text, font_size=sp(40), size_hint_y=None, height=dp(50), halign='center')
+        msg = ChineseLabel(text="", font_size=sp(14), size_hint_y=None, height=dp(100), halign='center')
+        btn = ChineseButton(text=btn_text, size_hint_y=None, height=dp(45), font_size=sp(16), **btn_kwargs)
 
-            popup = Popup(title=title, title_font_size=sp(18), title_color=SUCCESS,
-                          content=content, size_hint=(0.9, 0.45), auto_dismiss=False)
+        content.add_widget(icon)
+        content.add_widget(msg)
+        content.add_widget(btn)
 
-            btn.bind(on_press=lambda x: popup.dismiss())
-            popup.open()
-        except Exception as e:
-            print(f"Dialog error: {e}", file=sys.stderr)
+        popup = Popup(title="", title_font_size=sp(18), title_color=title_color,
+                      content=content, size_hint=(0.9, 0.45), auto_dismiss=False)
 
+        btn.bind(on_press=popup.dismiss)
+        return popup, msg
 
 if __name__ == "__main__":
     try:
-        print("DuckDecode: Starting...", file=sys.stderr)
+        if _DEBUG:
+            sys.stderr.write("DuckDecode: Starting...\n")
         DuckDecodeApp().run()
     except Exception as e:
         print(f"Fatal: {e}", file=sys.stderr)
@@ -7,6 +7,7 @@ Usage:
     python duck_decode_cli.py input.png [password] [--output OUTPUT]
 """
 import argparse
+import io
 import os
 import struct
 import sys
@@ -14,20 +15,45 @@ import numpy as np
 from PIL import Image
 
 try:
-    import torch
-    HAS_TORCH = True
+    from numba import njit
+    HAS_NUMBA = True
 except ImportError:
-    HAS_TORCH = False
-
-try:
-    from moviepy import VideoFileClip
-    HAS_MOVIEPY = True
-except ImportError:
-    HAS_MOVIEPY = False
+    HAS_NUMBA = False
 
 CATEGORY = "SSTool"
 WATERMARK_SKIP_W_RATIO = 0.40
 WATERMARK_SKIP_H_RATIO = 0.08
+_U32 = struct.Struct(">I")
+
+
+if HAS_NUMBA:
+    @njit(cache=True, boundscheck=False)
+    def _extract_bits_kernel(arr, skip_h, skip_w, k, n_vals, out):
+        """单次遍历像素：跳过水印区域、取低k位并直接拼接写入out"""
+        h, w, c = arr.shape
+        mask = (1 << k) - 1
+        acc = 0
+        nacc = 0
+        o = 0
+        i = 0
+        for y in range(h):
+            x0 = skip_w if y < skip_h else 0
+            for x in range(x0, w):
+                for ch in range(c):
+                    if i >= n_vals:
+                        if nacc > 0:
+                            out[o] = (acc << (8 - nacc)) & 0xFF
+                        return
+                    acc = (acc << k) | (arr[y, x, ch] & mask)
+                    nacc += k
+                    i += 1
+                    while nacc >= 8:
+                        nacc -= 8
+                        out[o] = (acc >> nacc) & 0xFF
+                        o += 1
+                    acc &= (1 << nacc) - 1
+        if nacc > 0:
+            out[o] = (acc << (8 - nacc)) & 0xFF
 
 
 def _extract_payload_with_k(arr: np.ndarray, k: int) -> bytes:
@@ -35,37 +61,73 @@ def _extract_payload_with_k(arr: np.ndarray, k: int) -> bytes:
     h, w, c = arr.shape
     skip_w = int(w * WATERMARK_SKIP_W_RATIO)
     skip_h = int(h * WATERMARK_SKIP_H_RATIO)
-    mask2d = np.ones((h, w), dtype=bool)
-    if skip_w > 0 and skip_h > 0:
-        mask2d[:skip_h, :skip_w] = False
-    mask3d = np.repeat(mask2d[:, :, None], c, axis=2)
-    flat = arr.reshape(-1)
-    idxs = np.flatnonzero(mask3d.reshape(-1))
-    vals = (flat[idxs] & ((1 << k) - 1)).astype(np.uint8)
-    ub = np.unpackbits(vals, bitorder="big").reshape(-1, 8)[:, -k:]
-    bits = ub.reshape(-1)
-    if len(bits) < 32:
+    nbits = (h * w - skip_h * skip_w) * c * k
+    if nbits < 32:
         raise ValueError("Insufficient image data. 图像数据不足")
-    len_bits = bits[:32]
-    length_bytes = np.packbits(len_bits, bitorder="big").tobytes()
-    header_len = struct.unpack(">I", length_bytes)[0]
+    # 先只取长度前缀，k 不对时在这里就失败；长度合理再按长度取出 header
+    head = _extract_low_bits(arr, skip_h, skip_w, (32 + k - 1) // k, k)
+    header_len = _U32.unpack_from(head)[0]
     total_bits = 32 + header_len * 8
-    if header_len <= 0 or total_bits > len(bits):
+    if header_len <= 0 or total_bits > nbits:
         raise ValueError("Payload length invalid. 载荷长度异常")
-    payload_bits = bits[32:32 + header_len * 8]
-    return np.packbits(payload_bits, bitorder="big").tobytes()
+    data = _extract_low_bits(arr, skip_h, skip_w, (total_bits + k - 1) // k, k)
+    return data[4:4 + header_len].tobytes()
+
+
+def _extract_low_bits(arr: np.ndarray, skip_h: int, skip_w: int, n: int, k: int) -> np.ndarray:
+    """按行优先顺序取水印区域外的前n个值，返回其低k位拼接成的字节流"""
+    if HAS_NUMBA:
+        out = np.empty((n * k + 7) // 8, dtype=np.uint8)
+        _extract_bits_kernel(arr, skip_h, skip_w, k, n, out)
+        return out
+    # 保留区域 = 水印右侧的顶部条带 + 其下方的整行，直接切片拼接，不再构造掩码和索引数组
+    # 顶部条带只切出前n个值所在的行，探测长度时不必复制整条条带
+    row = (arr.shape[1] - skip_w) * arr.shape[2]
+    top = arr[:min(skip_h, (n + row - 1) // row), skip_w:].reshape(-1)[:n]
+    vals = np.concatenate((top, arr[skip_h:].reshape(-1)[:n - len(top)]))
+    vals &= (1 << k) - 1
+    return _pack_low_bits(vals, k)
+
+
+def _pack_low_bits(vals: np.ndarray, k: int) -> np.ndarray:
+    """把每个值的低k位按大端顺序拼接成字节流（vals须已按k位掩码）"""
+    n = len(vals)
+    if k == 8:
+        # 低8位就是字节本身，无需拆位
+        return vals
+    if k in (2, 6):
+        # 4个值恰好拼成整字节：k=2 -> 1字节，k=6 -> 3字节，直接移位拼接
+        if n % 4:
+            vals = np.concatenate([vals, np.zeros(4 - n % 4, dtype=np.uint8)])
+        q = vals.reshape(-1, 4)
+        if k == 2:
+            out = (q[:, 0] << 6) | (q[:, 1] << 4) | (q[:, 2] << 2) | q[:, 3]
+        else:
+            out = np.empty((len(q), 3), dtype=np.uint8)
+            out[:, 0] = (q[:, 0] << 2) | (q[:, 1] >> 4)
+            out[:, 1] = (q[:, 1] << 4) | (q[:, 2] >> 2)
+            out[:, 2] = (q[:, 2] << 6) | q[:, 3]
+            out = out.reshape(-1)
+        return out[:(n * k + 7) // 8]
+    bits = np.unpackbits(vals, bitorder="big").reshape(-1, 8)[:, -k:].reshape(-1)
+    return np.packbits(bits, bitorder="big")
 
 
-def _generate_key_stream(password: str, salt: bytes, length: int) -> bytes:
+def _generate_key_stream(password: str, salt: bytes, length: int) -> bytearray:
     """生成密钥流用于解密"""
     import hashlib
     key_material = (password + salt.hex()).encode("utf-8")
-    out = bytearray()
-    counter = 0
-    while len(out) < length:
-        out.extend(hashlib.sha256(key_material + str(counter).encode("utf-8")).digest())
-        counter += 1
-    return bytes(out[:length])
+    # 须与编码端一致：第 n 块为 sha256(key_material + 十进制 n)；
+    # key_material 只吸收一次，每块复制哈希状态后只补上计数器
+    base = hashlib.sha256(key_material)
+    # 一次分配好整段密钥流，逐块写入，最后一块按剩余长度截断
+    out = bytearray(length)
+    mv = memoryview(out)
+    for counter, off in enumerate(range(0, length, 32)):
+        h = base.copy()
+        h.update(b"%d" % counter)
+        mv[off:off + 32] = h.digest()[:length - off]
+    return out
 
 
 def _parse_header(header: bytes, password: str):
@@ -92,7 +154,7 @@ def _parse_header(header: bytes, password: str):
         raise ValueError("Header corrupted. 文件头损坏")
     ext = header[idx:idx + ext_len].decode("utf-8", errors="ignore")
     idx += ext_len
-    data_len = struct.unpack(">I", header[idx:idx + 4])[0]
+    data_len = _U32.unpack_from(header, idx)[0]
     idx += 4
     data = header[idx:]
     if len(data) != data_len:
@@ -106,14 +168,20 @@ def _parse_header(header: bytes, password: str):
     if check_hash != pwd_hash:
         raise ValueError("Wrong password. 密码错误")
     ks = _generate_key_stream(password, salt, len(data))
-    plain = bytes(a ^ b for a, b in zip(data, ks))
+    # 密钥流缓冲区由本函数独占，异或结果直接写回其中作为明文，不再另分配输出
+    out = np.frombuffer(ks, dtype=np.uint8)
+    np.bitwise_xor(out, np.frombuffer(data, dtype=np.uint8), out=out)
+    plain = ks
     return plain, ext
 
 
-def binpng_bytes_to_mp4_bytes(p: str) -> bytes:
+def binpng_bytes_to_mp4_bytes(raw: bytes) -> bytes:
     """将binpng格式的字节数据转换为mp4"""
-    img = Image.open(p).convert("RGB")
-    arr = np.array(img).astype(np.uint8)
+    # raw 本身就是 PNG 文件内容，直接在内存中解码，不再落地临时文件
+    img = Image.open(io.BytesIO(raw))
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    arr = np.asarray(img)
     flat = arr.reshape(-1, 3).reshape(-1)
     return flat.tobytes().rstrip(b"\x00")
 
@@ -131,8 +199,11 @@ def decode_from_image(image_path: str, password: str = "", output_dir: str = "."
         tuple: (输出文件路径, 文件扩展名)
     """
     # 加载图像
+    # RGB 图像本身就是 uint8，asarray 只做 Pillow 导出的那一次复制
     img = Image.open(image_path)
-    arr = np.array(img.convert("RGB")).astype(np.uint8)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    arr = np.asarray(img)
 
     # 尝试不同的k值提取载荷
     header = None
@@ -158,11 +229,7 @@ def decode_from_image(image_path: str, password: str = "", output_dir: str = "."
 
     # 处理.binpng格式
     if ext.endswith(".binpng"):
-        tmp_png = out_path + ".binpng"
-        with open(tmp_png, "wb") as f:
-            f.write(raw)
-        mp4_bytes = binpng_bytes_to_mp4_bytes(tmp_png)
-        os.unlink(tmp_png)
+        mp4_bytes = binpng_bytes_to_mp4_bytes(raw)
         final_path = out_path + ".mp4"
         with open(final_path, "wb") as f:
             f.write(mp4_bytes)
@@ -3,6 +3,9 @@
 Duck Decode GUI - 隐写解码图形界面工具
 从图片中解码隐藏的文件内容
 """
+import hashlib
+import hmac
+import io
 import os
 import struct
 import sys
@@ -14,14 +17,50 @@ from PyQt5.QtWidgets import (
     QPushButton, QLabel, QLineEdit, QTextEdit, QFileDialog,
     QProgressBar, QMessageBox, QGroupBox
 )
-from PyQt5.QtCore import QThread, pyqtSignal, Qt
-from PyQt5.QtGui import QFont, QIcon
+from PyQt5.QtCore import QThread, QTimer, pyqtSignal, Qt
+from PyQt5.QtGui import QFont, QIcon, QTextCursor
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
 
 CATEGORY = "SSTool"
 WATERMARK_SKIP_W_RATIO = 0.40
 WATERMARK_SKIP_H_RATIO = 0.08
 
 
+if HAS_NUMBA:
+    @njit(cache=True, boundscheck=False)
+    def _extract_bits_kernel(arr, skip_h, skip_w, k, n_vals, out):
+        """单次遍历像素：跳过水印区域、取低k位并直接拼接写入out"""
+        h, w, c = arr.shape
+        mask = (1 << k) - 1
+        acc = 0
+        nacc = 0
+        o = 0
+        i = 0
+        for y in range(h):
+            x0 = skip_w if y < skip_h else 0
+            for x in range(x0, w):
+                for ch in range(c):
+                    if i >= n_vals:
+                        if nacc > 0:
+                            out[o] = (acc << (8 - nacc)) & 0xFF
+                        return
+                    acc = (acc << k) | (arr[y, x, ch] & mask)
+                    nacc += k
+                    i += 1
+                    while nacc >= 8:
+                        nacc -= 8
+                        out[o] = (acc >> nacc) & 0xFF
+                        o += 1
+                    acc &= (1 << nacc) - 1
+        if nacc > 0:
+            out[o] = (acc << (8 - nacc)) & 0xFF
+
+
 class DecodeWorker(QThread):
     """解码工作线程"""
     progress = pyqtSignal(str)
@@ -38,7 +77,10 @@ class DecodeWorker(QThread):
         try:
             self.progress.emit("正在加载图像...")
             img = Image.open(self.image_path)
-            arr = np.array(img.convert("RGB")).astype(np.uint8)
+            # 载体图一般已是 RGB，无需再转换出一份新图像
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            arr = np.asarray(img)
 
             self.progress.emit("正在提取隐写数据...")
             header = None
@@ -63,19 +105,13 @@ class DecodeWorker(QThread):
             out_path = os.path.join(self.output_dir, name)
 
             if ext.endswith(".binpng"):
-                tmp_png = out_path + ".binpng"
-                with open(tmp_png, "wb") as f:
-                    f.write(raw)
-                mp4_bytes = self._binpng_bytes_to_mp4_bytes(tmp_png)
-                os.unlink(tmp_png)
+                mp4_bytes = self._binpng_bytes_to_mp4_bytes(raw)
                 final_path = out_path + ".mp4"
-                with open(final_path, "wb") as f:
-                    f.write(mp4_bytes)
+                self._write_file(final_path, mp4_bytes)
                 final_ext = "mp4"
             else:
                 final_path = out_path + ("." + ext if not ext.startswith(".") else ext)
-                with open(final_path, "wb") as f:
-                    f.write(raw)
+                self._write_file(final_path, raw)
                 final_ext = ext.lstrip(".")
 
             # 计算文件大小
@@ -96,35 +132,69 @@ class DecodeWorker(QThread):
         h, w, c = arr.shape
         skip_w = int(w * WATERMARK_SKIP_W_RATIO)
         skip_h = int(h * WATERMARK_SKIP_H_RATIO)
-        mask2d = np.ones((h, w), dtype=bool)
-        if skip_w > 0 and skip_h > 0:
-            mask2d[:skip_h, :skip_w] = False
-        mask3d = np.repeat(mask2d[:, :, None], c, axis=2)
-        flat = arr.reshape(-1)
-        idxs = np.flatnonzero(mask3d.reshape(-1))
-        vals = (flat[idxs] & ((1 << k) - 1)).astype(np.uint8)
-        ub = np.unpackbits(vals, bitorder="big").reshape(-1, 8)[:, -k:]
-        bits = ub.reshape(-1)
-        if len(bits) < 32:
+        nbits = (h * w - skip_h * skip_w) * c * k
+        if nbits < 32:
             raise ValueError("Insufficient image data. 图像数据不足")
-        len_bits = bits[:32]
-        length_bytes = np.packbits(len_bits, bitorder="big").tobytes()
-        header_len = struct.unpack(">I", length_bytes)[0]
+        # 先只取长度前缀，k 不对时在这里就失败；长度合理再按长度取出 header
+        head = self._extract_low_bits(arr, skip_h, skip_w, (32 + k - 1) // k, k)
+        header_len = struct.unpack(">I", head[:4].tobytes())[0]
         total_bits = 32 + header_len * 8
-        if header_len <= 0 or total_bits > len(bits):
+        if header_len <= 0 or total_bits > nbits:
             raise ValueError("Payload length invalid. 载荷长度异常")
-        payload_bits = bits[32:32 + header_len * 8]
-        return np.packbits(payload_bits, bitorder="big").tobytes()
-
-    def _generate_key_stream(self, password: str, salt: bytes, length: int) -> bytes:
-        import hashlib
+        data = self._extract_low_bits(arr, skip_h, skip_w, (total_bits + k - 1) // k, k)
+        return data[4:4 + header_len].tobytes()
+
+    def _extract_low_bits(self, arr: np.ndarray, skip_h: int, skip_w: int, n: int, k: int) -> np.ndarray:
+        """按行优先顺序取水印区域外的前n个值，返回其低k位拼接成的字节流"""
+        if HAS_NUMBA:
+            out = np.empty((n * k + 7) // 8, dtype=np.uint8)
+            _extract_bits_kernel(arr, skip_h, skip_w, k, n, out)
+            return out
+        # 跳过左上角水印：按行优先顺序依次是水印右侧的顶部条带和其下的整行，
+        # 直接切片拼接，不再构造掩码和索引数组
+        # 顶部条带只切出前n个值所在的行，探测长度时不必复制整条条带
+        row = (arr.shape[1] - skip_w) * arr.shape[2]
+        top = arr[:min(skip_h, (n + row - 1) // row), skip_w:].reshape(-1)[:n]
+        vals = np.concatenate((top, arr[skip_h:].reshape(-1)[:n - len(top)]))
+        vals &= (1 << k) - 1
+        return self._pack_low_bits(vals, k)
+
+    def _pack_low_bits(self, vals: np.ndarray, k: int) -> np.ndarray:
+        """把每个值的低k位按大端顺序拼接成字节流（vals须已按k位掩码）"""
+        n = len(vals)
+        if k == 8:
+            # 低8位就是字节本身，无需拆位
+            return vals
+        if k in (2, 6):
+            # 4个值恰好拼成整字节：k=2 -> 1字节，k=6 -> 3字节，直接移位拼接
+            if n % 4:
+                vals = np.concatenate([vals, np.zeros(4 - n % 4, dtype=np.uint8)])
+            q = vals.reshape(-1, 4)
+            if k == 2:
+                out = (q[:, 0] << 6) | (q[:, 1] << 4) | (q[:, 2] << 2) | q[:, 3]
+            else:
+                out = np.empty((len(q), 3), dtype=np.uint8)
+                out[:, 0] = (q[:, 0] << 2) | (q[:, 1] >> 4)
+                out[:, 1] = (q[:, 1] << 4) | (q[:, 2] >> 2)
+                out[:, 2] = (q[:, 2] << 6) | q[:, 3]
+                out = out.reshape(-1)
+            return out[:(n * k + 7) // 8]
+        bits = np.unpackbits(vals, bitorder="big").reshape(-1, 8)[:, -k:].reshape(-1)
+        return np.packbits(bits, bitorder="big")
+
+    def _generate_key_stream(self, password: str, salt: bytes, length: int) -> bytearray:
         key_material = (password + salt.hex()).encode("utf-8")
-        out = bytearray()
-        counter = 0
-        while len(out) < length:
-            out.extend(hashlib.sha256(key_material + str(counter).encode("utf-8")).digest())
-            counter += 1
-        return bytes(out[:length])
+        # 须与编码端一致：第 n 块为 sha256(key_material + 十进制 n)；
+        # key_material 只吸收一次，每块复制哈希状态后只补上计数器
+        base = hashlib.sha256(key_material)
+        # 一次分配好整段密钥流，逐块写入，最后一块按剩余长度截断
+        out = bytearray(length)
+        mv = memoryview(out)
+        for counter, off in enumerate(range(0, length, 32)):
+            h = base.copy()
+            h.update(b"%d" % counter)
+            mv[off:off + 32] = h.digest()[:length - off]
+        return out
 
     def _parse_header(self, header: bytes, password: str):
         idx = 0
@@ -158,19 +228,46 @@ class DecodeWorker(QThread):
             return data, ext
         if not password:
             raise ValueError("Password required. 需要密码")
-        import hashlib
         check_hash = hashlib.sha256((password + salt.hex()).encode("utf-8")).digest()
-        if check_hash != pwd_hash:
+        if not hmac.compare_digest(check_hash, pwd_hash):
             raise ValueError("Wrong password. 密码错误")
         ks = self._generate_key_stream(password, salt, len(data))
-        plain = bytes(a ^ b for a, b in zip(data, ks))
+        # 密钥流缓冲区由本函数独占，异或结果直接写回其中作为明文，不再另分配输出
+        out = np.frombuffer(ks, dtype=np.uint8)
+        np.bitwise_xor(out, np.frombuffer(data, dtype=np.uint8), out=out)
+        plain = ks
         return plain, ext
 
-    def _binpng_bytes_to_mp4_bytes(self, p: str) -> bytes:
-        img = Image.open(p).convert("RGB")
-        arr = np.array(img).astype(np.uint8)
-        flat = arr.reshape(-1, 3).reshape(-1)
-        return flat.tobytes().rstrip(b"\x00")
+    def _write_file(self, path: str, data: bytes):
+        """用 os.write 直接写出，不经过 Python 的缓冲层"""
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o666)
+        try:
+            mv = memoryview(data)
+            while mv:
+                mv = mv[os.write(fd, mv):]
+        finally:
+            os.close(fd)
+
+    def _binpng_bytes_to_mp4_bytes(self, raw: bytes) -> bytes:
+        # raw 本身就是 PNG 文件内容，直接在内存中解码，不再落地临时文件
+        img = Image.open(io.BytesIO(raw))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        arr = np.asarray(img)
+        return self._strip_trailing_zeros(arr.reshape(-1))
+
+    def _strip_trailing_zeros(self, flat: np.ndarray) -> bytes:
+        """从尾部按块向前找最后一个非零字节，只复制它之前的数据"""
+        end = flat.size
+        step = 1 << 16
+        while end > 0:
+            start = max(0, end - step)
+            nz = np.flatnonzero(flat[start:end])
+            if nz.size:
+                end = start + int(nz[-1]) + 1
+                break
+            end = start
+        return flat[:end].tobytes()
 
 
 class DuckDecodeWindow(QMainWindow):
@@ -179,6 +276,12 @@ class DuckDecodeWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.worker = None
+        # 日志先缓存，50ms 内的多条合并成一次 append，只重排和滚动一次
+        self._log_buf = []
+        self._log_timer = QTimer(self)
+        self._log_timer.setSingleShot(True)
+        self._log_timer.setInterval(50)
+        self._log_timer.timeout.connect(self.flush_log)
         self.init_ui()
 
     def init_ui(self):
@@ -311,6 +414,7 @@ class DuckDecodeWindow(QMainWindow):
 
         # 清空日志
         self.log_text.clear()
+        self._log_buf.clear()
         self.log(f"开始解码: {os.path.basename(input_path)}")
         self.log(f"输出目录: {output_dir}")
 
@@ -334,6 +438,7 @@ class DuckDecodeWindow(QMainWindow):
         self.log(f"输出文件: {output_path}")
         self.log(f"文件类型: {ext}")
         self.log(f"文件大小: {size_str}")
+        self.flush_log()
 
         QMessageBox.information(
             self,
@@ -346,6 +451,7 @@ class DuckDecodeWindow(QMainWindow):
         self.decode_btn.setEnabled(True)
         self.log("-" * 50)
         self.log(f"✗ 错误: {error_msg}")
+        self.flush_log()
 
         QMessageBox.critical(
             self,
@@ -360,7 +466,21 @@ class DuckDecodeWindow(QMainWindow):
             subprocess.Popen(f'explorer "{path}"')
 
     def log(self, message):
-        self.log_text.append(message)
+        self._log_buf.append(message)
+        if not self._log_timer.isActive():
+            self._log_timer.start()
+
+    def flush_log(self):
+        self._log_timer.stop()
+        if not self._log_buf:
+            return
+        # 按纯文本追加，不像 append() 那样把整批内容当作富文本解析
+        text = "\n".join(self._log_buf)
+        if not self.log_text.document().isEmpty():
+            text = "\n" + text
+        self.log_text.moveCursor(QTextCursor.End)
+        self.log_text.insertPlainText(text)
+        self._log_buf.clear()
         # 自动滚动到底部
         self.log_text.verticalScrollBar().setValue(
             self.log_text.verticalScrollBar().maximum()
@@ -3,8 +3,12 @@
 Duck Decode Android - 隐写解码移动端工具
 从图片中解码隐藏的文件内容
 """
+import hashlib
+import hmac
+import io
 import os
 import struct
+import threading
 import numpy as np
 from PIL import Image
 
@@ -21,49 +25,151 @@ from kivy.clock import Clock
 from kivy.utils import platform
 from kivy.core.window import Window
 
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
 CATEGORY = "SSTool"
 WATERMARK_SKIP_W_RATIO = 0.40
 WATERMARK_SKIP_H_RATIO = 0.08
+_U32 = struct.Struct(">I")
+_K_MASKS = {k: np.uint8((1 << k) - 1) for k in (2, 6, 8)}
+
+
+if HAS_NUMBA:
+    @njit(cache=True, boundscheck=False)
+    def _extract_bits_kernel(arr, skip_h, skip_w, k, n_vals, out):
+        """单次遍历像素：跳过水印区域、取低k位并直接拼接写入out"""
+        h, w, c = arr.shape
+        mask = (1 << k) - 1
+        acc = 0
+        nacc = 0
+        o = 0
+        i = 0
+        for y in range(h):
+            x0 = skip_w if y < skip_h else 0
+            for x in range(x0, w):
+                for ch in range(c):
+                    if i >= n_vals:
+                        if nacc > 0:
+                            out[o] = (acc << (8 - nacc)) & 0xFF
+                        return
+                    acc = (acc << k) | (arr[y, x, ch] & mask)
+                    nacc += k
+                    i += 1
+                    while nacc >= 8:
+                        nacc -= 8
+                        out[o] = (acc >> nacc) & 0xFF
+                        o += 1
+                    acc &= (1 << nacc) - 1
+        if nacc > 0:
+            out[o] = (acc << (8 - nacc)) & 0xFF
 
 
 class DecodeLogic:
     """解码逻辑类"""
 
+    # 最近一张图片各 k 的提取结果（header 或异常），换密码重试时免去重复提取
+    _cached_image = None
+    _cached_headers = {}
+
+    @staticmethod
+    def watermark_skip(h: int, w: int):
+        """左上角水印区域的高和宽"""
+        return int(h * WATERMARK_SKIP_H_RATIO), int(w * WATERMARK_SKIP_W_RATIO)
+
     @staticmethod
-    def extract_payload_with_k(arr: np.ndarray, k: int) -> bytes:
+    def read_header_len(arr: np.ndarray, k: int) -> int:
+        """只解出前32位的载荷长度并校验，用于快速排除不对的k"""
         h, w, c = arr.shape
-        skip_w = int(w * WATERMARK_SKIP_W_RATIO)
-        skip_h = int(h * WATERMARK_SKIP_H_RATIO)
-        mask2d = np.ones((h, w), dtype=bool)
-        if skip_w > 0 and skip_h > 0:
-            mask2d[:skip_h, :skip_w] = False
-        mask3d = np.repeat(mask2d[:, :, None], c, axis=2)
-        flat = arr.reshape(-1)
-        idxs = np.flatnonzero(mask3d.reshape(-1))
-        vals = (flat[idxs] & ((1 << k) - 1)).astype(np.uint8)
-        ub = np.unpackbits(vals, bitorder="big").reshape(-1, 8)[:, -k:]
-        bits = ub.reshape(-1)
-        if len(bits) < 32:
+        skip_h, skip_w = DecodeLogic.watermark_skip(h, w)
+        nbits = (h * w - skip_h * skip_w) * c * k
+        if nbits < 32:
             raise ValueError("Insufficient image data. 图像数据不足")
-        len_bits = bits[:32]
-        length_bytes = np.packbits(len_bits, bitorder="big").tobytes()
-        header_len = struct.unpack(">I", length_bytes)[0]
+        n_head = (32 + k - 1) // k
+        head = DecodeLogic.pack_low_bits(DecodeLogic.take_retained(arr, skip_h, skip_w, n_head, k), k)
+        header_len = _U32.unpack_from(head)[0]
         total_bits = 32 + header_len * 8
-        if header_len <= 0 or total_bits > len(bits):
+        if header_len <= 0 or total_bits > nbits:
             raise ValueError("Payload length invalid. 载荷长度异常")
-        payload_bits = bits[32:32 + header_len * 8]
-        return np.packbits(payload_bits, bitorder="big").tobytes()
+        return header_len
+
+    @staticmethod
+    def extract_payload_with_k(arr: np.ndarray, k: int, header_len: int = None) -> bytes:
+        if header_len is None:
+            header_len = DecodeLogic.read_header_len(arr, k)
+        h, w, c = arr.shape
+        skip_h, skip_w = DecodeLogic.watermark_skip(h, w)
+        n_need = (32 + header_len * 8 + k - 1) // k
+        if HAS_NUMBA:
+            out = np.empty((n_need * k + 7) // 8, dtype=np.uint8)
+            _extract_bits_kernel(arr, skip_h, skip_w, k, n_need, out)
+            return out[4:4 + header_len].tobytes()
+        vals = DecodeLogic.take_retained(arr, skip_h, skip_w, n_need, k)
+        return DecodeLogic.pack_low_bits(vals, k)[4:4 + header_len].tobytes()
+
+    @staticmethod
+    def take_retained(arr: np.ndarray, skip_h: int, skip_w: int, n: int, k: int) -> np.ndarray:
+        """按行优先顺序取出左上角水印区域之外的前n个字节，同一遍里只保留低k位"""
+        c = arr.shape[2]
+        mask_k = _K_MASKS.get(k)
+        if mask_k is None:
+            mask_k = np.uint8((1 << k) - 1)
+        out = np.empty(n, dtype=np.uint8)
+        # 水印区域是矩形：保留部分 = 上方条带的右侧 + 下方整块，都可以直接切片
+        top = arr[:skip_h, skip_w:]
+        n_top = min(n, top.size)
+        if n_top:
+            row = top.shape[1] * c
+            full, part = divmod(n_top, row)
+            np.bitwise_and(top[:full], mask_k, out=out[:full * row].reshape(full, top.shape[1], c))
+            if part:
+                np.bitwise_and(top[full].reshape(-1)[:part], mask_k, out=out[full * row:n_top])
+        if n > n_top:
+            np.bitwise_and(arr[skip_h:].reshape(-1)[:n - n_top], mask_k, out=out[n_top:])
+        return out
 
     @staticmethod
-    def generate_key_stream(password: str, salt: bytes, length: int) -> bytes:
-        import hashlib
-        key_material = (password + salt.hex()).encode("utf-8")
-        out = bytearray()
-        counter = 0
-        while len(out) < length:
-            out.extend(hashlib.sha256(key_material + str(counter).encode("utf-8")).digest())
-            counter += 1
-        return bytes(out[:length])
+    def pack_low_bits(vals: np.ndarray, k: int) -> np.ndarray:
+        """把每个值的低k位按大端顺序直接拼接成字节流（vals须已按k位掩码）"""
+        n = len(vals)
+        if k == 8:
+            return vals
+        if k in (2, 6) and n % 4:
+            vals = np.concatenate([vals, np.zeros(4 - n % 4, dtype=np.uint8)])
+        if k == 2:
+            q = vals.reshape(-1, 4)
+            out = (q[:, 0] << 6) | (q[:, 1] << 4) | (q[:, 2] << 2) | q[:, 3]
+        elif k == 6:
+            # 4个6位值 -> 3个字节
+            q = vals.reshape(-1, 4)
+            out = np.empty((len(q), 3), dtype=np.uint8)
+            out[:, 0] = (q[:, 0] << 2) | (q[:, 1] >> 4)
+            out[:, 1] = (q[:, 1] << 4) | (q[:, 2] >> 2)
+            out[:, 2] = (q[:, 2] << 6) | q[:, 3]
+            out = out.reshape(-1)
+        else:
+            bits = np.unpackbits(vals[:, None], axis=1, bitorder="big")[:, -k:]
+            return np.packbits(bits, bitorder="big")
+        return out[:(n * k + 7) // 8]
+
+    @staticmethod
+    def key_hasher(password: str, salt: bytes):
+        """已吸收 password + salt.hex() 的 sha256 状态，同一次解码中密码校验和密钥流共用"""
+        return hashlib.sha256((password + salt.hex()).encode("utf-8"))
+
+    @staticmethod
+    def generate_key_stream(base, length: int) -> bytes:
+        # 密钥流须与编码端保持一致：sha256(key_material + 十进制计数器)，
+        # base 已吸收 key_material，每块复制哈希状态后只补上计数器
+        blocks = []
+        for counter in range((length + 31) // 32):
+            h = base.copy()
+            h.update(b"%d" % counter)
+            blocks.append(h.digest())
+        return b"".join(blocks)[:length]
 
     @staticmethod
     def parse_header(header: bytes, password: str):
@@ -89,7 +195,7 @@ class DecodeLogic:
             raise ValueError("Header corrupted. 文件头损坏")
         ext = header[idx:idx + ext_len].decode("utf-8", errors="ignore")
         idx += ext_len
-        data_len = struct.unpack(">I", header[idx:idx + 4])[0]
+        data_len = _U32.unpack_from(header, idx)[0]
         idx += 4
         data = header[idx:]
         if len(data) != data_len:
@@ -98,41 +204,100 @@ class DecodeLogic:
             return data, ext
         if not password:
             raise ValueError("Password required. 需要密码")
-        import hashlib
-        check_hash = hashlib.sha256((password + salt.hex()).encode("utf-8")).digest()
-        if check_hash != pwd_hash:
+        base = DecodeLogic.key_hasher(password, salt)
+        if not hmac.compare_digest(base.digest(), pwd_hash):
             raise ValueError("Wrong password. 密码错误")
-        ks = DecodeLogic.generate_key_stream(password, salt, len(data))
-        plain = bytes(a ^ b for a, b in zip(data, ks))
-        return plain, ext
+        ks = DecodeLogic.generate_key_stream(base, len(data))
+        return DecodeLogic.xor_bytes(data, ks), ext
 
     @staticmethod
-    def binpng_bytes_to_mp4_bytes(p: str) -> bytes:
-        img = Image.open(p).convert("RGB")
-        arr = np.array(img).astype(np.uint8)
-        flat = arr.reshape(-1, 3).reshape(-1)
-        return flat.tobytes().rstrip(b"\x00")
+    def xor_bytes(data: bytes, ks: bytes) -> bytearray:
+        # 在 data 的唯一一份拷贝上原地异或，直接返回 bytearray，不再复制成 bytes
+        buf = bytearray(data)
+        out = np.frombuffer(buf, dtype=np.uint8)
+        np.bitwise_xor(out, np.frombuffer(ks, dtype=np.uint8, count=len(buf)), out=out)
+        return buf
 
     @staticmethod
-    def decode(image_path: str, password: str, output_dir: str, callback=None):
-        """执行解码"""
-        try:
-            if callback:
-                callback("Loading image... 正在加载图像")
+    def binpng_bytes_to_mp4_bytes(raw: bytes) -> bytes:
+        # raw 本身就是 PNG 文件内容，直接在内存中解码，不再落地临时文件
+        img = Image.open(io.BytesIO(raw))
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        arr = np.asarray(img)
+        return DecodeLogic.strip_trailing_zeros(arr.reshape(-1))
 
-            img = Image.open(image_path)
-            arr = np.array(img.convert("RGB")).astype(np.uint8)
+    @staticmethod
+    def strip_trailing_zeros(flat: np.ndarray) -> bytes:
+        """从尾部按块向前找最后一个非零字节，只复制它之前的数据"""
+        end = flat.size
+        step = 1 << 16
+        while end > 0:
+            start = max(0, end - step)
+            nz = np.flatnonzero(flat[start:end])
+            if nz.size:
+                end = start + int(nz[-1]) + 1
+                break
+            end = start
+        return flat[:end].tobytes()
 
-            if callback:
-                callback("Extracting data... 正在提取隐写数据")
+    @staticmethod
+    def write_file(path: str, data: bytes):
+        """用 os.write 直接写出，不经过 Python 的缓冲层"""
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o666)
+        try:
+            mv = memoryview(data)
+            while mv:
+                mv = mv[os.write(fd, mv):]
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def load_image_array(image_path: str) -> np.ndarray:
+        """加载图片为 RGB uint8 数组"""
+        img = Image.open(image_path)
+        # RGB 图片无需 convert，asarray 只做 Pillow 导出的那一次复制
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        return np.asarray(img)
 
-            header = None
+    @staticmethod
+    def decode(image_path: str, password: str, output_dir: str, callback=None):
+        """执行解码"""
+        try:
+            st = os.stat(image_path)
+            image_key = (os.path.abspath(image_path), st.st_mtime_ns, st.st_size)
+            if DecodeLogic._cached_image != image_key:
+                DecodeLogic._cached_image = image_key
+                DecodeLogic._cached_headers = {}
+            headers = DecodeLogic._cached_headers
+
+            arr = None
             raw = None
             ext = None
             last_err = None
             for k in (2, 6, 8):
+                if k not in headers:
+                    if arr is None:
+                        if callback:
+                            callback("Loading image... 正在加载图像")
+                        arr = DecodeLogic.load_image_array(image_path)
+                        if callback:
+                            callback("Extracting data... 正在提取隐写数据")
+                    try:
+                        # 先只读长度前缀，长度不合理的k不会进入完整提取
+                        header_len = DecodeLogic.read_header_len(arr, k)
+                        headers[k] = DecodeLogic.extract_payload_with_k(arr, k, header_len)
+                    except Exception as e:
+                        # 只缓存异常类型和参数：缓存的异常对象一旦被抛出就会带上
+                        # traceback，其栈帧会让像素数组一直留在类级缓存里
+                        headers[k] = (type(e), e.args)
+                header = headers[k]
+                if isinstance(header, tuple):
+                    err_type, err_args = header
+                    last_err = err_type(*err_args)
+                    continue
                 try:
-                    header = DecodeLogic.extract_payload_with_k(arr, k)
                     raw, ext = DecodeLogic.parse_header(header, password)
                     break
                 except Exception as e:
@@ -150,19 +315,13 @@ class DecodeLogic:
             out_path = os.path.join(output_dir, name)
 
             if ext.endswith(".binpng"):
-                tmp_png = out_path + ".binpng"
-                with open(tmp_png, "wb") as f:
-                    f.write(raw)
-                mp4_bytes = DecodeLogic.binpng_bytes_to_mp4_bytes(tmp_png)
-                os.unlink(tmp_png)
+                mp4_bytes = DecodeLogic.binpng_bytes_to_mp4_bytes(raw)
                 final_path = out_path + ".mp4"
-                with open(final_path, "wb") as f:
-                    f.write(mp4_bytes)
+                DecodeLogic.write_file(final_path, mp4_bytes)
                 final_ext = "mp4"
             else:
                 final_path = out_path + ("." + ext if not ext.startswith(".") else ext)
-                with open(final_path, "wb") as f:
-                    f.write(raw)
+                DecodeLogic.write_file(final_path, raw)
                 final_ext = ext.lstrip(".")
 
             size = os.path.getsize(final_path)
@@ -278,6 +437,8 @@ class DuckDecodeApp(App):
 
         self.selected_file = None
         self.output_dir = self.get_default_output_dir()
+        self._log_buf = []
+        self._popup = None
 
         return main_layout
 
@@ -330,26 +491,20 @@ class DuckDecodeApp(App):
                     Uri = autoclass('android.net.Uri')
                     content_resolver = autoclass('org.kivy.android.PythonActivity').mActivity.getContentResolver()
 
-                    # 读取文件
-                    import io
-                    from kivy.core.image import Image as CoreImage
-
-                    # 使用ContentResolver打开输入流
-                    input_stream = content_resolver.openInputStream(uri)
-                    data = bytearray()
-                    buffer = bytearray(4096)
-                    while True:
-                        read = input_stream.read(buffer, 0, 4096)
-                        if read == -1:
-                            break
-                        data.extend(buffer[:read])
-                    input_stream.close()
-
-                    # 保存到临时文件
+                    # 使用ContentResolver打开输入流，边读边写入临时文件
                     import tempfile
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as f:
-                        f.write(data)
-                        self.selected_file = f.name
+                    input_stream = content_resolver.openInputStream(uri)
+                    buffer = bytearray(65536)
+                    try:
+                        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as f:
+                            while True:
+                                read = input_stream.read(buffer, 0, 65536)
+                                if read == -1:
+                                    break
+                                f.write(memoryview(buffer)[:read])
+                            self.selected_file = f.name
+                    finally:
+                        input_stream.close()
 
                     self.file_label.text = f"Selected: {os.path.basename(self.selected_file)}"
                     self.log(f"File selected: {self.selected_file}")
@@ -381,42 +536,58 @@ class DuckDecodeApp(App):
 
         # 禁用按钮
         self.decode_btn.disabled = True
+        self._log_buf.clear()
         self.log_text.text = ""
         self.log("Starting decode... 开始解码\n")
 
-        # 使用定时器执行解码（避免阻塞UI）
-        Clock.schedule_once(lambda dt: self.do_decode(password), 0.1)
+        # 在后台线程执行解码，避免阻塞UI
+        threading.Thread(
+            target=self.do_decode,
+            args=(self.selected_file, password, self.output_dir),
+            daemon=True
+        ).start()
+
+    def do_decode(self, image_path, password, output_dir):
+        """执行解码（后台线程），界面更新统一投递回主线程"""
+        def log_async(message):
+            Clock.schedule_once(lambda dt: self.log(message))
 
-    def do_decode(self, password):
-        """执行解码"""
         try:
             result = DecodeLogic.decode(
-                self.selected_file,
+                image_path,
                 password,
-                self.output_dir,
-                callback=self.log
-            )
-
-            final_path, final_ext, size_str = result
-            self.log("-" * 50)
-            self.log("SUCCESS! / 解码成功!")
-            self.log(f"File: {final_path}")
-            self.log(f"Type: {final_ext}")
-            self.log(f"Size: {size_str}")
-
-            self.decode_btn.disabled = False
-            self.open_btn.disabled = False
-
-            self.show_popup(
-                "Success / 成功",
-                f"File decoded successfully!\n解码成功!\n\nType: {final_ext}\nSize: {size_str}"
+                output_dir,
+                callback=log_async
             )
-
         except Exception as e:
-            self.decode_btn.disabled = False
-            self.log("-" * 50)
-            self.log(f"ERROR / 错误: {str(e)}")
-            self.show_popup("Error / 错误", str(e))
+            error = str(e)
+            Clock.schedule_once(lambda dt: self.on_decode_error(error))
+            return
+        Clock.schedule_once(lambda dt: self.on_decode_success(result))
+
+    def on_decode_success(self, result):
+        """解码成功（主线程）"""
+        final_path, final_ext, size_str = result
+        self.log("-" * 50)
+        self.log("SUCCESS! / 解码成功!")
+        self.log(f"File: {final_path}")
+        self.log(f"Type: {final_ext}")
+        self.log(f"Size: {size_str}")
+
+        self.decode_btn.disabled = False
+        self.open_btn.disabled = False
+
+        self.show_popup(
+            "Success / 成功",
+            f"File decoded successfully!\n解码成功!\n\nType: {final_ext}\nSize: {size_str}"
+        )
+
+    def on_decode_error(self, error):
+        """解码失败（主线程）"""
+        self.decode_btn.disabled = False
+        self.log("-" * 50)
+        self.log(f"ERROR / 错误: {error}")
+        self.show_popup("Error / 错误", error)
 
     def open_output_dir(self, instance):
         """打开输出目录"""
@@ -435,27 +606,37 @@ class DuckDecodeApp(App):
             subprocess.Popen(f'explorer "{self.output_dir}"')
 
     def log(self, message):
-        """添加日志"""
-        self.log_text.text += message + "\n"
+        """添加日志（先缓存，100ms 内合并为一次文本更新）"""
+        if not self._log_buf:
+            Clock.schedule_once(self.flush_log, 0.1)
+        self._log_buf.append(message)
+
+    def flush_log(self, dt=None):
+        """把缓存的日志一次性写入日志框"""
+        if self._log_buf:
+            self.log_text.text += "\n".join(self._log_buf) + "\n"
+            self._log_buf.clear()
 
     def show_popup(self, title, message):
-        """显示弹窗"""
-        popup_layout = BoxLayout(orientation='vertical', padding=20, spacing=10)
-        popup_label = Label(text=message, font_size='16sp', text_size=(None, None))
-        popup_layout.add_widget(popup_label)
-
-        close_btn = Button(text="OK / 确定", size_hint_y=None, height=50, font_size='18sp')
-        popup_layout.add_widget(close_btn)
-
-        popup = Popup(
-            title=title,
-            content=popup_layout,
-            size_hint=(0.9, 0.5),
-            auto_dismiss=False
-        )
-        close_btn.bind(on_press=popup.dismiss)
-        popup.open()
+        """显示弹窗（弹窗控件只创建一次，之后复用）"""
+        if self._popup is None:
+            popup_layout = BoxLayout(orientation='vertical', padding=20, spacing=10)
+            self._popup_label = Label(font_size='16sp', text_size=(None, None))
+            popup_layout.add_widget(self._popup_label)
+
+            close_btn = Button(text="OK / 确定", size_hint_y=None, height=50, font_size='18sp')
+            popup_layout.add_widget(close_btn)
+
+            self._popup = Popup(
+                content=popup_layout,
+                size_hint=(0.9, 0.5),
+                auto_dismiss=False
+            )
+            close_btn.bind(on_press=self._popup.dismiss)
 
+        self._popup.title = title
+        self._popup_label.text = message
+        self._popup.open()
 
 if __name__ == "__main__":
     DuckDecodeApp().run()
\ No newline at end of file